@@ -0,0 +1,277 @@
+"""
+Priority-aware scheduler between the watcher's transition logic and SMS.send_text.
+
+Each alert is split into recipient batches and queued with its severity class
+(DANGER > WARNING > SAFE). A background worker always sends the most urgent
+ready batch first, so a DANGER alert jumps ahead of the remaining batches of a
+SAFE/WARNING broadcast.
+
+A new alert supersedes queued batches of equal or lower severity (they are
+stale), but never drops a queued higher-severity alert: a SAFE that follows a
+DANGER waits until the DANGER batches are out. A batch already in flight
+always completes.
+
+Throughput is bounded per class (minimum seconds between batches of that class)
+and globally (provider rate limit); see ALERT_* in settings.py.
+
+Batches stay in the queue until the provider accepted them, so pending_jobs()
+(saved in the watcher checkpoint) covers everything not yet sent, and
+restore() replays it after a crash. stop(drain=True) sends what is queued
+before returning.
+
+send_text must raise when a batch was not delivered; the batch then stays
+queued and is retried with exponential backoff (ALERT_RETRY_*). If the error
+has a .recipients list, only those are retried. While a batch waits for its
+retry, less urgent batches wait too, so recipients never get a SAFE ahead of
+an undelivered DANGER. send_text returning False means it was deliberately
+not sent (DRY-RUN): the batch is dropped without calling on_sent.
+"""
+import threading
+import time
+import itertools
+from typing import Optional, Dict, List, Any, Callable
+
+from settings import load_settings
+
+# ---------- Config ----------
+PRIORITY = {"DANGER": 0, "WARNING": 1, "SAFE": 2}
+DEFAULT_PRIORITY = len(PRIORITY)  # unknown statuses go last
+
+
+class AlertScheduler:
+    def __init__(
+        self,
+        sms_client,
+        recipients: List[str],
+        on_sent: Optional[Callable[[Dict[str, Any]], None]] = None,
+        on_change: Optional[Callable[[], None]] = None,
+        batch_size: Optional[int] = None,
+        class_intervals: Optional[Dict[str, float]] = None,
+        provider_interval: Optional[float] = None,
+        retry_base: Optional[float] = None,
+        retry_max: Optional[float] = None,
+    ):
+        config = load_settings()
+        self.sms_client = sms_client
+        self.recipients = list(recipients)
+        # Called from the worker thread with each batch the provider accepted,
+        # and (on_change) after every send attempt, i.e. when pending_jobs()
+        # may have changed
+        self.on_sent = on_sent
+        self.on_change = on_change
+        self.batch_size = max(
+            batch_size if batch_size is not None else config.alert_batch_size, 1
+        )
+        self.class_intervals = (
+            dict(class_intervals)
+            if class_intervals is not None
+            else {
+                "DANGER": config.alert_interval_danger,
+                "WARNING": config.alert_interval_warning,
+                "SAFE": config.alert_interval_safe,
+            }
+        )
+        self.provider_interval = (
+            provider_interval
+            if provider_interval is not None
+            else config.alert_provider_interval_sec
+        )
+        self.retry_base = (
+            retry_base if retry_base is not None else config.alert_retry_base_sec
+        )
+        self.retry_max = (
+            retry_max if retry_max is not None else config.alert_retry_max_sec
+        )
+        self._cond = threading.Condition()
+        self._queue: List[Dict[str, Any]] = []
+        self._seq = itertools.count()
+        self._class_next: Dict[str, float] = {}
+        self._provider_next = 0.0
+        self._running = False
+        self._draining = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- Lifecycle ----------
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._draining = False
+        self._thread = threading.Thread(
+            target=self._run, name="alert-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, drain: bool = False, timeout: Optional[float] = None):
+        """Stop the worker; with drain=True it first sends everything queued."""
+        with self._cond:
+            self._running = False
+            self._draining = drain
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued batch was sent. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue, timeout)
+
+    # ---------- Producer side ----------
+    def submit(
+        self,
+        status: str,
+        text: str,
+        recipients: Optional[List[str]] = None,
+        supersede: bool = True,
+    ) -> int:
+        """
+        Queue text for all recipients under status's priority class.
+        With supersede=True, queued batches of equal or lower severity are
+        cancelled. Returns the number of cancelled batches.
+        """
+        status = (status or "").strip().upper()
+        priority = PRIORITY.get(status, DEFAULT_PRIORITY)
+        targets = list(recipients) if recipients is not None else self.recipients
+        with self._cond:
+            cancelled = 0
+            if supersede:
+                keep = []
+                for job in self._queue:
+                    if job["in_flight"] or job["priority"] < priority:
+                        keep.append(job)
+                        continue
+                    cancelled += 1
+                    print(
+                        f"[SCHED] Superseded queued {job['status']} batch "
+                        f"({len(job['recipients'])} recipients) by {status}"
+                    )
+                self._queue = keep
+            for i in range(0, len(targets), self.batch_size):
+                self._enqueue(status, text, targets[i : i + self.batch_size])
+            self._cond.notify_all()
+        return cancelled
+
+    def restore(self, jobs: List[Dict[str, Any]]):
+        """Re-queue batches saved from pending_jobs() (e.g. after a restart)."""
+        with self._cond:
+            for job in jobs:
+                self._enqueue(job["status"], job["text"], list(job["recipients"]))
+            self._cond.notify_all()
+
+    def _enqueue(self, status: str, text: str, recipients: List[str]):
+        self._queue.append(
+            {
+                "priority": PRIORITY.get(status, DEFAULT_PRIORITY),
+                "seq": next(self._seq),
+                "status": status,
+                "text": text,
+                "recipients": recipients,
+                "in_flight": False,
+                "attempts": 0,
+                "retry_at": 0.0,
+            }
+        )
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def pending_jobs(self) -> List[Dict[str, Any]]:
+        """Unsent batches (including one in flight), oldest first, JSON-friendly."""
+        with self._cond:
+            return [
+                {
+                    "status": job["status"],
+                    "text": job["text"],
+                    "recipients": list(job["recipients"]),
+                }
+                for job in sorted(self._queue, key=lambda j: j["seq"])
+            ]
+
+    # ---------- Worker ----------
+    def _next_ready(self, now: float):
+        """(job, 0) for the most urgent sendable job, or (None, seconds to wait)."""
+        wait = None
+        provider_wait = max(self._provider_next - now, 0.0)
+        for job in sorted(self._queue, key=lambda j: (j["priority"], j["seq"])):
+            if job["in_flight"]:
+                continue
+            retry_wait = max(job["retry_at"] - now, 0.0)
+            class_wait = max(self._class_next.get(job["status"], 0.0) - now, 0.0)
+            job_wait = max(retry_wait, class_wait, provider_wait)
+            if job_wait == 0.0:
+                return job, 0.0
+            wait = job_wait if wait is None else min(wait, job_wait)
+            if retry_wait > 0.0:
+                break  # nothing less urgent goes out ahead of a failed batch
+        return None, wait
+
+    def _class_interval(self, status: str) -> float:
+        if status in self.class_intervals:
+            return self.class_intervals[status]
+        return max(self.class_intervals.values(), default=0.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if not self._running and not (self._draining and self._queue):
+                        return
+                    job, wait = self._next_ready(time.monotonic())
+                    if job is not None:
+                        break
+                    # Woken early by submit() so a new DANGER is considered at once
+                    self._cond.wait(wait)
+                job["in_flight"] = True
+                now = time.monotonic()
+                self._provider_next = now + self.provider_interval
+                self._class_next[job["status"]] = now + self._class_interval(
+                    job["status"]
+                )
+            try:
+                accepted = self.sms_client.send_text(
+                    job["text"], recipients=job["recipients"]
+                )
+            except Exception as e:
+                self._retry_later(job, e)
+            else:
+                with self._cond:
+                    self._queue.remove(job)
+                    self._cond.notify_all()
+                if accepted is False:
+                    print(f"[SCHED] {job['status']} batch not sent (suppressed)")
+                elif self.on_sent:
+                    self._callback(
+                        self.on_sent,
+                        {
+                            "status": job["status"],
+                            "text": job["text"],
+                            "recipients": list(job["recipients"]),
+                        },
+                    )
+            if self.on_change:
+                self._callback(self.on_change)
+
+    def _callback(self, fn: Callable, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"[SCHED] Callback {getattr(fn, '__name__', fn)} failed: {e!r}")
+
+    def _retry_later(self, job: Dict[str, Any], error: Exception):
+        with self._cond:
+            job["attempts"] += 1
+            delay = min(self.retry_base * 2 ** (job["attempts"] - 1), self.retry_max)
+            job["retry_at"] = time.monotonic() + delay
+            # Retry only the recipients the provider did not accept
+            failed = getattr(error, "recipients", None) or ()
+            narrowed = [r for r in job["recipients"] if r in failed]
+            if narrowed:
+                job["recipients"] = narrowed
+            job["in_flight"] = False
+            self._cond.notify_all()
+        print(
+            f"[SCHED] Failed to send {job['status']} batch "
+            f"(attempt {job['attempts']}), retrying in {delay:.1f}s: {error!r}"
+        )
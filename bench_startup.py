@@ -0,0 +1,66 @@
+"""
+Import-time report for the app modules.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter for
+each module and prints the best and median cumulative time over N runs.
+The numbers depend on the machine, so this is informational only; the
+regression guard is tests/test_startup.py, which checks that imports stay
+free of config reads, heavy packages and file/env side effects.
+
+    python bench_startup.py                 # all app modules
+    python bench_startup.py --runs 10 sms   # only sms, 10 runs
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+from typing import Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ussd (and so main) includes Flask, which dominates its cost.
+MODULES = ["settings", "status_snapshot", "log_rotation", "sms", "ussd", "main"]
+
+# "import time: self [us] | cumulative | imported package"
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def cumulative_import_ms(module: str) -> Optional[float]:
+    """Cumulative import time of module in a fresh interpreter, or None on failure."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or [""])[-1]
+        print(f"[BENCH] import {module} failed: {last}")
+        return None
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        # The top-level entry is the one with no indentation after the bar.
+        if m and m.group(4) == module and len(m.group(3)) == 1:
+            return int(m.group(2)) / 1000.0
+    return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    for module in args.modules:
+        samples = [cumulative_import_ms(module) for _ in range(args.runs)]
+        samples = sorted(s for s in samples if s is not None)
+        if not samples:
+            continue
+        best, median = samples[0], samples[len(samples) // 2]
+        print(f"[BENCH] {module:<16} best={best:8.2f} ms  median={median:8.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,404 @@
+"""
+Size/time based rotation for the append-only CSV logs (ussd_logs.csv, events_log.csv).
+
+The active log is closed once it grows past LOG_MAX_BYTES or its first row is
+older than LOG_MAX_AGE_SEC. The closed segment is gzip-compressed into
+LOG_ARCHIVE_DIR and recorded in a small index (segment, first_ts, last_ts, rows)
+so time-range queries only open the segments that overlap the range.
+
+The first column of every rotated log must be an ISO-8601 timestamp. That is
+also how a missing header row is recognised: logs written before the header
+was added (e.g. the original events_log.csv) start straight with a data row,
+which is counted and indexed like any other; the header is added to its
+archived copy.
+"""
+import os
+import csv
+import gzip
+import io
+import itertools
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Iterator, Any, Tuple, Set
+
+from settings import load_settings
+
+# ---------- Config ----------
+# LOG_MAX_BYTES / LOG_MAX_AGE_SEC / LOG_ARCHIVE_DIR: see settings.py
+INDEX_HEADERS = ["segment", "first_ts", "last_ts", "rows"]
+CLOSING_SUFFIX = ".closing"
+# A closed segment being compressed is renamed to <segment>.archiving-<epoch>.
+# The rename is the claim: only one process/worker wins it.
+ARCHIVING_SUFFIX = ".archiving-"
+
+# Serialises rotation + append within a process so no row can land in a
+# segment that is being closed.
+_lock = threading.Lock()
+_archive_lock = threading.Lock()
+# path -> (inode, size, first row timestamp) of the active segment as last seen.
+# Another worker may rotate the file under us; a new inode or a smaller size
+# means the cached start time is stale and the first row is read again.
+_active_started: Dict[str, Tuple[int, int, Optional[datetime]]] = {}
+# Seconds to wait before compressing a closed segment, so appends from other
+# processes that still hold the old file open can finish.
+ARCHIVE_GRACE_SEC = 1.0
+# A claim older than this was left by a worker that died mid-archive; it is
+# taken over by the next sweep.
+ARCHIVE_STALE_SEC = 300.0
+# Logs whose leftover segments this process has already swept for.
+_swept: Set[str] = set()
+
+
+# ---------- Paths ----------
+def archive_dir_for(path: str) -> str:
+    archive_dir = load_settings().log_archive_dir
+    if archive_dir:
+        return archive_dir
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "archive")
+
+
+def index_path_for(path: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(archive_dir_for(path), f"{stem}.index.csv")
+
+
+def _parse_ts(value: str) -> Optional[datetime]:
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def _is_header(row: List[str], headers: Optional[List[str]] = None) -> bool:
+    """A first row is the header unless its first column is a timestamp."""
+    if headers is not None and [c.strip() for c in row] == list(headers):
+        return True
+    return bool(row) and _parse_ts(row[0]) is None
+
+
+def _first_row_ts(path: str) -> Optional[datetime]:
+    """Timestamp of the first data row (reads only the first two lines)."""
+    try:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            row = next(csv.reader([f.readline()]), None)
+            if row and _is_header(row):
+                row = next(csv.reader([f.readline()]), None)
+    except FileNotFoundError:
+        return None
+    return _parse_ts(row[0]) if row else None
+
+
+def _dict_reader(f, headers: Optional[List[str]] = None):
+    """
+    csv.DictReader over f that also reads logs without a header row, using
+    headers as the field names for those.
+    """
+    first_line = f.readline()
+    first = next(csv.reader([first_line]), None)
+    if not first:
+        return iter(())
+    if _is_header(first, headers):
+        return csv.DictReader(f, fieldnames=[c.strip() for c in first])
+    if not headers:
+        raise ValueError("log has no header row; pass headers")
+    return csv.DictReader(itertools.chain([first_line], f), fieldnames=headers)
+
+
+# ---------- Rotation ----------
+def _write_header_file(path: str, headers: List[str]) -> str:
+    """Write a header-only segment to a temp file next to path; return its path."""
+    fd, tmp_path = tempfile.mkstemp(
+        prefix=".tmp-", dir=os.path.dirname(os.path.abspath(path))
+    )
+    with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(headers)
+    return tmp_path
+
+
+def _needs_rotation(path: str, st: os.stat_result) -> bool:
+    config = load_settings()
+    if st.st_size >= config.log_max_bytes:
+        return True
+    if config.log_max_age_sec <= 0:
+        return False
+    cached = _active_started.get(path)
+    if cached is None or cached[0] != st.st_ino or st.st_size < cached[1]:
+        started = _first_row_ts(path)
+    else:
+        started = cached[2]
+    _active_started[path] = (st.st_ino, st.st_size, started)
+    if started is None:
+        return False
+    age = (datetime.now(timezone.utc) - started).total_seconds()
+    return age >= config.log_max_age_sec
+
+
+def _rotate_locked(path: str, headers: List[str]) -> bool:
+    """Close the active segment and swap in a fresh one. Caller holds _lock."""
+    archive_dir = archive_dir_for(path)
+    os.makedirs(archive_dir, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    closing = os.path.join(archive_dir, f"{stem}-{stamp}.csv{CLOSING_SUFFIX}")
+    fresh = _write_header_file(path, headers)
+    moved = False
+    try:
+        try:
+            # Keep path in place the whole time: hard-link the old segment
+            # away, then atomically replace path with the fresh one.
+            os.link(path, closing)
+        except (OSError, NotImplementedError):
+            # No hard links (e.g. FAT/some Windows shares): move it instead.
+            os.replace(path, closing)
+            moved = True
+        os.replace(fresh, path)
+    except OSError as e:
+        # Undo: path must keep the old segment (with its header) rather than
+        # go missing. PermissionError (Windows: another handle still has the
+        # log open) is retried on the next append.
+        if moved:
+            os.replace(closing, path)
+        elif os.path.exists(closing):
+            os.remove(closing)
+        os.remove(fresh)
+        if isinstance(e, PermissionError):
+            return False
+        raise
+    _active_started.pop(path, None)
+    return True
+
+
+def rotate_if_needed(path: str, headers: List[str]) -> bool:
+    """
+    Close the active segment at path if it is too large or too old and start
+    a fresh one with headers. Returns True if a rotation happened.
+    Prefer append_row(), which also does the append under the same lock.
+    """
+    with _lock:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        rotated = _needs_rotation(path, st) and _rotate_locked(path, headers)
+    if rotated:
+        _start_archiver(path, headers)
+    return rotated
+
+
+def append_row(path: str, headers: List[str], row: List[Any]):
+    """
+    Append row to the log at path, rotating first if needed. The rotation
+    check and the append happen under one lock, so concurrent writers in this
+    process never lose a row or write into a segment being archived.
+
+    Never raises: logging must not block the caller (the watcher logs before
+    it queues an alert). If rotation fails the row is appended to the current
+    file and rotation is retried next time; write errors are printed.
+    """
+    rotated = False
+    # The first append in a process also archives segments left behind by a
+    # crash (or by a worker that exited before archiving them).
+    sweep = path not in _swept
+    _swept.add(path)
+    with _lock:
+        try:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                os.replace(_write_header_file(path, headers), path)
+            else:
+                rotated = _needs_rotation(path, st) and _rotate_locked(
+                    path, headers
+                )
+        except Exception as e:
+            print(f"[LOG ROTATE] Rotation failed for {path}, appending: {e!r}")
+        try:
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                csv.writer(f).writerow(row)
+        except Exception as e:
+            print(f"[LOG ROTATE] Failed to write row to {path}: {e!r}")
+    if rotated or sweep:
+        _start_archiver(path, headers)
+
+
+def _start_archiver(path: str, headers: List[str]):
+    # Compress off the ingest path so appends are not held up by gzip.
+    threading.Thread(
+        target=archive_pending,
+        args=(path, ARCHIVE_GRACE_SEC, headers),
+        name="log-archiver",
+        daemon=True,
+    ).start()
+
+
+def archive_pending(
+    path: str, delay: float = 0.0, headers: Optional[List[str]] = None
+):
+    """
+    Compress every closed-but-unarchived segment of path and index it.
+    headers is written at the top of archived segments that lack a header row.
+    Safe to run from several processes at once: each segment is claimed by
+    renaming it first, and only the winner compresses and indexes it.
+    """
+    if delay > 0:
+        time.sleep(delay)
+    directory = archive_dir_for(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    with _archive_lock:
+        try:
+            names = sorted(os.listdir(directory))
+        except FileNotFoundError:
+            return
+        for name in names:
+            if not name.startswith(stem + "-"):
+                continue
+            claimed = _claim_segment(directory, name)
+            if claimed is None:
+                continue
+            try:
+                _archive_segment(path, claimed, headers)
+            except Exception as e:
+                print(f"[LOG ROTATE] Failed to archive {claimed}: {e}")
+
+
+def _claim_segment(directory: str, name: str) -> Optional[str]:
+    """
+    Rename a closed (or stale claimed) segment to a fresh claim name and
+    return its path, or None if it is not claimable or someone else won.
+    """
+    now = int(time.time())
+    if name.endswith(CLOSING_SUFFIX):
+        base = name[: -len(CLOSING_SUFFIX)]
+    elif ARCHIVING_SUFFIX in name:
+        base, _, claimed_at = name.rpartition(ARCHIVING_SUFFIX)
+        if not claimed_at.isdigit() or now - int(claimed_at) < ARCHIVE_STALE_SEC:
+            return None  # another worker is on it (or a temp file)
+    else:
+        return None
+    claimed = os.path.join(directory, f"{base}{ARCHIVING_SUFFIX}{now}")
+    try:
+        os.rename(os.path.join(directory, name), claimed)
+    except FileNotFoundError:
+        return None
+    return claimed
+
+
+def _append_index(path: str, entry: List[Any]):
+    """Add entry to the index of path unless its segment is already listed."""
+    index_path = index_path_for(path)
+    if not os.path.exists(index_path):
+        # Create it header-first in one step, even with several writers.
+        tmp_path = _write_header_file(index_path, INDEX_HEADERS)
+        try:
+            os.link(tmp_path, index_path)
+        except FileExistsError:
+            pass
+        except (OSError, NotImplementedError):
+            if not os.path.exists(index_path):
+                os.replace(tmp_path, index_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    # A taken-over claim may already have been indexed before the crash
+    if any(e.get("segment") == entry[0] for e in read_index(path)):
+        return
+    with open(index_path, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(entry)
+
+
+def _archive_segment(
+    path: str, claimed: str, headers: Optional[List[str]] = None
+):
+    first_ts = last_ts = ""
+    rows = 0
+    has_header = False
+    with open(claimed, "r", newline="", encoding="utf-8") as f:
+        for i, row in enumerate(csv.reader(f)):
+            if not row:
+                continue
+            if i == 0 and _is_header(row, headers):
+                has_header = True
+                continue
+            if not first_ts:
+                first_ts = row[0]
+            last_ts = row[0]
+            rows += 1
+
+    gz_path = claimed.rpartition(ARCHIVING_SUFFIX)[0] + ".gz"
+    tmp_path = claimed + ".gz.tmp"
+    with open(claimed, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+        if not has_header and headers:
+            line = io.StringIO()
+            csv.writer(line).writerow(headers)
+            dst.write(line.getvalue().encode("utf-8"))
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp_path, gz_path)
+    _append_index(path, [os.path.basename(gz_path), first_ts, last_ts, rows])
+    os.remove(claimed)
+
+
+# ---------- Queries ----------
+def read_index(path: str) -> List[Dict[str, str]]:
+    try:
+        with open(index_path_for(path), "r", newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+    except FileNotFoundError:
+        return []
+
+
+def iter_rows(
+    path: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    headers: Optional[List[str]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield log rows (as dicts) with first-column timestamp in [since, until],
+    oldest first. Archived segments outside the range are never opened.
+    headers names the columns of segments written without a header row.
+    """
+    since_ts = _parse_ts(since) if since else None
+    until_ts = _parse_ts(until) if until else None
+
+    def in_range(ts: Optional[datetime]) -> bool:
+        if ts is None:
+            return since_ts is None and until_ts is None
+        if since_ts is not None and ts < since_ts:
+            return False
+        if until_ts is not None and ts > until_ts:
+            return False
+        return True
+
+    directory = archive_dir_for(path)
+    for entry in read_index(path):
+        seg_first = _parse_ts(entry.get("first_ts", ""))
+        seg_last = _parse_ts(entry.get("last_ts", ""))
+        if since_ts is not None and seg_last is not None and seg_last < since_ts:
+            continue
+        if until_ts is not None and seg_first is not None and seg_first > until_ts:
+            continue
+        seg_path = os.path.join(directory, entry["segment"])
+        try:
+            with gzip.open(seg_path, "rt", newline="", encoding="utf-8") as f:
+                for row in _dict_reader(f, headers):
+                    if in_range(_parse_ts(next(iter(row.values()), ""))):
+                        yield row
+        except FileNotFoundError:
+            print(f"[LOG ROTATE] Indexed segment missing: {seg_path}")
+
+    try:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            for row in _dict_reader(f, headers):
+                if in_range(_parse_ts(next(iter(row.values()), ""))):
+                    yield row
+    except FileNotFoundError:
+        return
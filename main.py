@@ -1,25 +1,35 @@
 # main.py
-import os
 import threading
 import sys
 import signal
 
+from settings import load_settings
+
 # Import your modules
-# (These imports do NOT start anything because both files guard their runners with if __name__ == '__main__')
-import sms
-from ussd import app as ussd_app
+# (Importing them has no side effects: config, log files and HTTP setup happen
+# in explicit startup hooks below. sms is imported inside the watcher thread
+# so the USSD server does not wait on it.)
+import ussd
+
 
 def run_sms():
-    # Runs the CSV watcher + SMS sender 
+    # Runs the CSV watcher + SMS sender
+    import sms
+
     sms.watch_csv_and_send()
 
+
 def run_ussd():
     # Runs the Flask app that Africa's Talking calls via your ngrok URL
-    port = int(os.getenv("PORT", 5000))
-    debug = os.getenv("FLASK_DEBUG", "0") == "1"
-    ussd_app.run(host="0.0.0.0", port=port, debug=debug)
+    config = load_settings()
+    ussd.app.run(host="0.0.0.0", port=config.port, debug=config.flask_debug)
+
 
 def main():
+    # Load .env / env config once for every component
+    load_settings()
+    ussd.startup()
+
     # Start SMS watcher in a daemon thread
     t = threading.Thread(target=run_sms, name="sms-watcher", daemon=True)
     t.start()
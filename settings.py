@@ -0,0 +1,130 @@
+"""
+Process-wide configuration, loaded once from the environment (and .env).
+
+Nothing is read at import time: call load_settings() from the code that needs
+config. The first call loads .env and builds a frozen Settings; later calls
+return the same object, so importing modules stays cheap and side-effect free.
+"""
+import os
+import sys
+import threading
+import types
+from typing import NamedTuple, Optional, Dict
+
+_lock = threading.Lock()
+_settings: Optional["Settings"] = None
+
+
+class Settings(NamedTuple):
+    # sms.py watcher
+    csv_path: str
+    events_log_path: str
+    at_username: str
+    at_api_key: Optional[str]
+    watcher_state_path: str
+    # alert_scheduler.py: seconds between batches per class / overall, batch size
+    alert_interval_danger: float
+    alert_interval_warning: float
+    alert_interval_safe: float
+    alert_provider_interval_sec: float
+    alert_batch_size: int
+    # alert_scheduler.py: retry backoff for failed sends (doubles up to the max)
+    alert_retry_base_sec: float
+    alert_retry_max_sec: float
+    # ussd.py
+    ussd_log_path: str
+    status_csv_path: str
+    bridge_status: str
+    last_alert: str
+    # log_rotation.py
+    log_max_bytes: int
+    log_max_age_sec: float
+    log_archive_dir: str  # "" means <log dir>/archive
+    # main.py
+    port: int
+    flask_debug: bool
+
+    @property
+    def sandbox(self) -> bool:
+        return self.at_username == "sandbox"
+
+
+def _load_dotenv():
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        print("[SETTINGS] python-dotenv not installed; using process env only.")
+        return
+    load_dotenv()
+
+
+def load_settings() -> Settings:
+    """Build Settings on first call (loading .env), then return the cached copy."""
+    global _settings
+    if _settings is not None:
+        return _settings
+    with _lock:
+        if _settings is None:
+            _load_dotenv()
+            _settings = Settings(
+                csv_path=os.getenv(
+                    "CSV_PATH", r"C:\dev_Projects\Python\ak\status_current.csv"
+                ),
+                events_log_path=os.getenv(
+                    "EVENTS_LOG_PATH", r"C:\dev_Projects\Python\ak\events_log.csv"
+                ),
+                at_username=os.getenv("AT_USERNAME", "sandbox"),
+                at_api_key=os.getenv("AT_API_KEY"),
+                watcher_state_path=os.getenv(
+                    "WATCHER_STATE_PATH", "watcher_state.json"
+                ),
+                alert_interval_danger=float(os.getenv("ALERT_INTERVAL_DANGER", "0")),
+                alert_interval_warning=float(
+                    os.getenv("ALERT_INTERVAL_WARNING", "1")
+                ),
+                alert_interval_safe=float(os.getenv("ALERT_INTERVAL_SAFE", "5")),
+                alert_provider_interval_sec=float(
+                    os.getenv("ALERT_PROVIDER_INTERVAL_SEC", "0.2")
+                ),
+                alert_batch_size=int(os.getenv("ALERT_BATCH_SIZE", "50")),
+                alert_retry_base_sec=float(os.getenv("ALERT_RETRY_BASE_SEC", "1")),
+                alert_retry_max_sec=float(os.getenv("ALERT_RETRY_MAX_SEC", "60")),
+                ussd_log_path=os.getenv("USSD_LOG_PATH", "ussd_logs.csv"),
+                # CSV with running status updates (timestamp,report,water_level_m)
+                status_csv_path=os.getenv("STATUS_CSV_PATH", "/status_current.csv"),
+                # Legacy fallbacks (kept in case CSV is missing/empty)
+                bridge_status=os.getenv("BRIDGE_STATUS", "SAFE"),
+                last_alert=os.getenv("LAST_ALERT", "No alert issued yet."),
+                log_max_bytes=int(os.getenv("LOG_MAX_BYTES", str(5 * 1024 * 1024))),
+                log_max_age_sec=float(
+                    os.getenv("LOG_MAX_AGE_SEC", str(7 * 24 * 3600))
+                ),
+                log_archive_dir=os.getenv("LOG_ARCHIVE_DIR", ""),
+                port=int(os.getenv("PORT", 5000)),
+                flask_debug=os.getenv("FLASK_DEBUG", "0") == "1",
+            )
+    return _settings
+
+
+def alias_settings(module_name: str, aliases: Dict[str, str]):
+    """
+    Keep former module constants (e.g. sms.CSV_PATH) readable as aliases of
+    Settings fields. Config is only read through load_settings(), so
+    assigning an alias would be silently ignored; it raises instead.
+    """
+
+    class _SettingsModule(types.ModuleType):
+        def __getattr__(self, name):
+            if name in aliases:
+                return getattr(load_settings(), aliases[name])
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+
+        def __setattr__(self, name, value):
+            if name in aliases:
+                raise AttributeError(
+                    f"{module_name}.{name} is read from settings; set the "
+                    f"environment variable (or .env entry) instead"
+                )
+            super().__setattr__(name, value)
+
+    sys.modules[module_name].__class__ = _SettingsModule
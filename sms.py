@@ -1,52 +1,25 @@
 from __future__ import print_function
-import requests as _r, os as _os
-
-_r.sessions.Session.trust_env = False
-_os.environ.update(
-    {
-        "HTTP_PROXY": "",
-        "HTTPS_PROXY": "",
-        "ALL_PROXY": "",
-        "NO_PROXY": "*",
-        "http_proxy": "",
-        "https_proxy": "",
-        "all_proxy": "",
-        "no_proxy": "*",
-        "REQUESTS_CA_BUNDLE": "",
-        "CURL_CA_BUNDLE": "",
-        "SSL_CERT_FILE": "",
-    }
-)
-DEBUG_HTTP = False
-if DEBUG_HTTP:
-    import logging, http.client as http_client
-
-    http_client.HTTPConnection.debuglevel = 1
-    logging.basicConfig(level=logging.DEBUG)
-    logging.getLogger("urllib3").setLevel(logging.DEBUG)
-    logging.getLogger("urllib3.connectionpool").setLevel(logging.DEBUG)
-# --------------------------------------------------------------------
 
 # ---------- Standard imports ----------
 import time
 import csv
+import atexit
+import threading
 import hashlib
-from typing import Optional, Dict, Any
-from dotenv import load_dotenv
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timezone
 import os
 
+import log_rotation
+from alert_scheduler import AlertScheduler
+import status_snapshot
+import watcher_state
+from settings import load_settings, alias_settings
+
 # ---------- Config ----------
-CSV_PATH = os.getenv("CSV_PATH", r"C:\dev_Projects\Python\ak\status_current.csv")
-EVENTS_LOG_PATH = os.getenv(
-    "EVENTS_LOG_PATH", r"C:\dev_Projects\Python\ak\events_log.csv"
-)
+# Paths and Africa's Talking credentials come from settings.load_settings()
 LOCATION_STR = "bridge near thoyandou"
 
-# Africa's Talking (from .env)
-load_dotenv()
-AT_USERNAME = os.getenv("AT_USERNAME", "sandbox")
-AT_API_KEY = os.getenv("AT_API_KEY")
 # If your sandbox sender/short-code is provisioned, set it via env:
 # e.g., AT_SENDER=21817 or your sandbox senderId
 SENDER = "21817"
@@ -57,6 +30,72 @@ RECIPIENTS = ["+27821234567", "+27822345678", "+27823456789"]
 SEND_ON_STATUS_CHANGE = True
 SEND_ON_START = True
 SEND_ENABLED = True  # set False for DRY-RUN
+DEBUG_HTTP = False
+SHUTDOWN_DRAIN_SEC = 10.0  # max time to send queued alerts on exit
+# Africa's Talking per-recipient statusCode values meaning the SMS was accepted
+# (100 Processed, 101 Sent, 102 Queued); anything else is retried.
+ACCEPTED_STATUS_CODES = {100, 101, 102}
+
+# Former module constants, readable as aliases of settings (see settings.py)
+alias_settings(
+    __name__,
+    {
+        "CSV_PATH": "csv_path",
+        "EVENTS_LOG_PATH": "events_log_path",
+        "AT_USERNAME": "at_username",
+        "AT_API_KEY": "at_api_key",
+    },
+)
+
+EVENTS_LOG_HEADERS = [
+    "detection_time_iso",
+    "source_timestamp",
+    "status",
+    "water_level_m",
+    "last_status_prev",
+    "signature",
+    "note",
+]
+
+
+# ---------- Startup ----------
+_http_configured = False
+
+
+def configure_http():
+    """
+    Strip proxy/CA env vars and make requests ignore them. Imports requests,
+    so it runs on first SMS client construction rather than at import time.
+    """
+    global _http_configured
+    if _http_configured:
+        return
+    import requests
+
+    requests.sessions.Session.trust_env = False
+    os.environ.update(
+        {
+            "HTTP_PROXY": "",
+            "HTTPS_PROXY": "",
+            "ALL_PROXY": "",
+            "NO_PROXY": "*",
+            "http_proxy": "",
+            "https_proxy": "",
+            "all_proxy": "",
+            "no_proxy": "*",
+            "REQUESTS_CA_BUNDLE": "",
+            "CURL_CA_BUNDLE": "",
+            "SSL_CERT_FILE": "",
+        }
+    )
+    if DEBUG_HTTP:
+        import logging, http.client as http_client
+
+        http_client.HTTPConnection.debuglevel = 1
+        logging.basicConfig(level=logging.DEBUG)
+        logging.getLogger("urllib3").setLevel(logging.DEBUG)
+        logging.getLogger("urllib3.connectionpool").setLevel(logging.DEBUG)
+    _http_configured = True
 
 
 # ---------- Utilities ----------
@@ -69,17 +108,7 @@ def ensure_events_log(path: str):
     if not os.path.exists(path):
         with open(path, "w", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
-            w.writerow(
-                [
-                    "detection_time_iso",
-                    "source_timestamp",
-                    "status",
-                    "water_level_m",
-                    "last_status_prev",
-                    "signature",
-                    "note",
-                ]
-            )
+            w.writerow(EVENTS_LOG_HEADERS)
 
 
 def log_event(
@@ -92,21 +121,20 @@ def log_event(
     signature: Optional[str],
     note: str,
 ):
-    """Append a single decision-trigger row to events log."""
-    ensure_events_log(path)
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(
-            [
-                detection_time_iso,
-                source_timestamp or "",
-                status or "",
-                f"{water_level_m:.3f}" if water_level_m is not None else "",
-                last_status_prev or "",
-                signature or "",
-                note,
-            ]
-        )
+    """Append a single decision-trigger row to events log (rotated when full/old)."""
+    log_rotation.append_row(
+        path,
+        EVENTS_LOG_HEADERS,
+        [
+            detection_time_iso,
+            source_timestamp or "",
+            status or "",
+            f"{water_level_m:.3f}" if water_level_m is not None else "",
+            last_status_prev or "",
+            signature or "",
+            note,
+        ],
+    )
 
 
 # ---------- CSV helpers ----------
@@ -114,7 +142,11 @@ def read_latest_row(path: str) -> Optional[Dict[str, Any]]:
     """
     Reads a CSV with header: timestamp,report,water_level_m
     Returns the last (latest) non-empty data row as a dict or None if not available.
+    Uses the published status snapshot when it is current, else parses the CSV.
     """
+    snap = status_snapshot.read_snapshot_for(path)
+    if snap and snap[0]:
+        return snap[0]
     try:
         with open(path, "r", encoding="utf-8") as f:
             reader = csv.DictReader(f)
@@ -136,6 +168,50 @@ def read_latest_row(path: str) -> Optional[Dict[str, Any]]:
         return None
 
 
+def read_latest_row_from(
+    path: str, start: int = 0, expected_sig: Optional[str] = None
+) -> Tuple[Optional[Dict[str, Any]], int]:
+    """
+    Like read_latest_row, but resumes at byte offset start (where the
+    previously seen latest row begins) instead of parsing the whole file.
+    The row found at start must still have expected_sig, otherwise the file
+    was rewritten and it is re-read from the top.
+    Returns (latest row, byte offset where that row starts).
+    """
+    try:
+        with open(path, "rb") as f:
+            header = f.readline()
+            fieldnames = next(csv.reader([header.decode("utf-8")]), [])
+            fieldnames = [h.strip() for h in fieldnames]
+            resumed = start > len(header)
+            if resumed:
+                f.seek(start)
+            pos = f.tell()
+            last, last_pos, first = None, pos, True
+            for raw in f:
+                line_pos, pos = pos, pos + len(raw)
+                values = next(csv.reader([raw.decode("utf-8")]), [])
+                row = dict(zip(fieldnames, values))
+                ts = (row.get("timestamp") or "").strip()
+                report = (row.get("report") or "").strip()
+                level = (row.get("water_level_m") or "").strip()
+                if not ts and not report and not level:
+                    continue
+                last = {"timestamp": ts, "report": report, "water_level_m": level}
+                last_pos = line_pos
+                if first and resumed and latest_row_signature(last) != expected_sig:
+                    return read_latest_row_from(path)
+                first = False
+            if last is None and resumed:
+                return read_latest_row_from(path)
+            return last, last_pos
+    except FileNotFoundError:
+        return None, 0
+    except Exception as e:
+        print(f"[CSV] Error reading CSV: {e}")
+        return None, 0
+
+
 def latest_row_signature(row: Optional[Dict[str, Any]]) -> Optional[str]:
     if not row:
         return None
@@ -165,36 +241,64 @@ def parse_level(level_str: str) -> Optional[float]:
 
 
 # ---------- SMS client (DIRECT REST; no SDK) ----------
-import requests
+class SMSSendError(Exception):
+    """The SMS was not delivered to recipients (the ones to retry)."""
+
+    def __init__(self, message: str, recipients: List[str]):
+        super().__init__(message)
+        self.recipients = recipients
+
+
+class _BaseURL:
+    """SMS.BASE_URL: sandbox or live endpoint, resolved from settings on access."""
+
+    def __get__(self, obj, owner):
+        return owner.SANDBOX_URL if load_settings().sandbox else owner.LIVE_URL
 
 
 class SMS:
-    BASE_URL = (
-        "https://api.sandbox.africastalking.com"
-        if AT_USERNAME == "sandbox"
-        else "https://api.africastalking.com"
-    )
+    SANDBOX_URL = "https://api.sandbox.africastalking.com"
+    LIVE_URL = "https://api.africastalking.com"
+    BASE_URL = _BaseURL()
 
     def __init__(self):
-        if not AT_API_KEY:
-            raise RuntimeError("AT_API_KEY is empty. Put it in your .env or env vars.")
+        configure_http()
+        import requests
+
+        config = load_settings()
+        self.username = config.at_username
+        # A missing key no longer stops startup; sends are refused until it is set.
+        self.api_key = config.at_api_key
+        if not self.api_key:
+            print("[SMS] AT_API_KEY is empty. Put it in your .env or env vars.")
         # Isolate a clean Session that never reads env/registry proxies
-        requests.sessions.Session.trust_env = False
         self.session = requests.Session()
         self.session.trust_env = False
         self.headers = {
-            "apiKey": AT_API_KEY,
+            "apiKey": self.api_key or "",
             "Accept": "application/json",
             "Content-Type": "application/x-www-form-urlencoded",
         }
 
-    def send_text(self, text: str):
+    def send_text(self, text: str, recipients: Optional[List[str]] = None) -> bool:
+        """
+        Send text to recipients (default RECIPIENTS). Returns True once Africa's
+        Talking accepted every recipient, False in DRY-RUN (nothing sent).
+        Raises SMSSendError when it was not delivered (no API key, network/HTTP
+        error, or recipients rejected); its .recipients are the ones to retry.
+        """
+        targets = list(recipients if recipients is not None else RECIPIENTS)
         if not SEND_ENABLED:
             print(f"[SMS] (DRY-RUN) Suppressed send: {text}")
-            return
+            return False
+        if not self.api_key:
+            print(f"[SMS] AT_API_KEY is empty → not sending: {text}")
+            raise SMSSendError("AT_API_KEY is empty", targets)
+        import requests
+
         payload = {
-            "username": AT_USERNAME,
-            "to": ",".join(RECIPIENTS),
+            "username": self.username,
+            "to": ",".join(targets),
             "message": text,
         }
         # include sender (you said it's provisioned in sandbox)
@@ -208,32 +312,111 @@ class SMS:
             )
             print("[SMS] Response:", resp.status_code, resp.text[:400])
             resp.raise_for_status()
+            data = resp.json().get("SMSMessageData") or {}
         except requests.exceptions.SSLError as e:
             print("[SMS] SSL error:", repr(e))
+            raise SMSSendError(f"SSL error: {e!r}", targets) from e
         except Exception as e:
             print("[SMS] Error while sending:", repr(e))
+            raise SMSSendError(f"Error while sending: {e!r}", targets) from e
+
+        accepted = {
+            r.get("number")
+            for r in data.get("Recipients") or []
+            if r.get("statusCode") in ACCEPTED_STATUS_CODES
+        }
+        rejected = [t for t in targets if t not in accepted]
+        if rejected:
+            raise SMSSendError(f"Not accepted: {data.get('Message')}", rejected)
+        return True
 
 
 # ---------- Watcher loop ----------
 def watch_csv_and_send(poll_sec: float = 0.3):
-    print(f"[BOOT] AT_USERNAME: {AT_USERNAME}")
-    print(f"[BOOT] AT_API_KEY set?: {bool(AT_API_KEY)}")
-    print(f"[BOOT] Watching: {os.path.abspath(CSV_PATH)}")
-    print(f"[BOOT] EVENTS_LOG: {os.path.abspath(EVENTS_LOG_PATH)}")
-    if AT_USERNAME == "sandbox":
+    config = load_settings()
+    csv_path = config.csv_path
+    events_log_path = config.events_log_path
+    print(f"[BOOT] AT_USERNAME: {config.at_username}")
+    print(f"[BOOT] AT_API_KEY set?: {bool(config.at_api_key)}")
+    print(f"[BOOT] Watching: {os.path.abspath(csv_path)}")
+    print(f"[BOOT] EVENTS_LOG: {os.path.abspath(events_log_path)}")
+    if config.sandbox:
         print("[BOOT] SANDBOX mode: use SMS Simulator numbers", flush=True)
     print(f"[BOOT] SEND_ENABLED={SEND_ENABLED} (DRY-RUN means no SMS will be sent)")
-    print("[DEBUG] Requests trust_env:", _r.sessions.Session.trust_env)
 
     sms_client = SMS()
-    ensure_events_log(EVENTS_LOG_PATH)
-
-    last_sig: Optional[str] = None
-    last_status: Optional[str] = None
-
-    # Initial read
-    init_row = read_latest_row(CSV_PATH)
-    print(f"[INIT] Latest row: {init_row}")
+    ensure_events_log(events_log_path)
+
+    state_path = config.watcher_state_path
+    state = watcher_state.load_state(state_path)
+    resumed = state is not None
+    if state is None:
+        state = dict(watcher_state.EMPTY_STATE)
+    # checkpoint() runs on this thread and on the scheduler worker (after sends)
+    state_lock = threading.Lock()
+
+    last_sig: Optional[str] = state["signature"]
+    last_status: Optional[str] = state["last_status"]
+    last_stamp = None
+
+    def read_row() -> Optional[Dict[str, Any]]:
+        # Snapshot when current; otherwise resume the CSV where the last row began
+        snap = status_snapshot.read_snapshot_for(csv_path)
+        if snap and snap[0]:
+            return snap[0]
+        stamp = watcher_state.file_stamp(csv_path)
+        if stamp is None or stamp[0] != state["inode"]:
+            state["offset"] = 0
+        row, state["offset"] = read_latest_row_from(
+            csv_path, state["offset"], state["signature"]
+        )
+        return row
+
+    def checkpoint():
+        # last_status is the status decided on; alerts not yet sent for it are
+        # saved in "pending" and replayed on restart.
+        with state_lock:
+            stamp = watcher_state.file_stamp(csv_path)
+            inode, size, mtime_ns = stamp if stamp else (None, None, None)
+            state.update(
+                signature=last_sig,
+                last_status=last_status,
+                pending=scheduler.pending_jobs(),
+                inode=inode,
+                size=size,
+                mtime_ns=mtime_ns,
+            )
+            watcher_state.save_state(state_path, state)
+
+    def on_sent(job: Dict[str, Any]):
+        # Only batches the provider accepted count as sent
+        with state_lock:
+            state.update(last_sent_at=now_iso(), last_sent_status=job["status"])
+
+    # Sends go through the scheduler so DANGER preempts lower-severity batches.
+    # It is started after the first poll, so restored batches that the current
+    # status makes stale are superseded before any of them can go out.
+    scheduler = AlertScheduler(
+        sms_client, RECIPIENTS, on_sent=on_sent, on_change=checkpoint
+    )
+    if state["pending"]:
+        print(f"[INIT] Replaying {len(state['pending'])} unsent alert batch(es)")
+        scheduler.restore(state["pending"])
+    # On normal exit (Ctrl-C, sys.exit) send what is still queued first
+    atexit.register(scheduler.stop, drain=True, timeout=SHUTDOWN_DRAIN_SEC)
+
+    if resumed:
+        # No startup broadcast: the loop alerts only if the status changed while down
+        print(
+            f"[INIT] Resumed from {state_path}: last_status={last_status} "
+            f"last_sent_status={state['last_sent_status']} "
+            f"last_sent_at={state['last_sent_at']}"
+        )
+        init_row = None
+    else:
+        # Initial read
+        init_row = read_row()
+        print(f"[INIT] Latest row: {init_row}")
 
     if init_row:
         init_status = (init_row.get("report") or "").strip().upper()
@@ -245,7 +428,7 @@ def watch_csv_and_send(poll_sec: float = 0.3):
             if text:
                 # --- LOG the startup decision trigger ---
                 log_event(
-                    EVENTS_LOG_PATH,
+                    events_log_path,
                     detection_time_iso=now_iso(),
                     source_timestamp=init_row.get("timestamp") or "",
                     status=init_status,
@@ -254,13 +437,23 @@ def watch_csv_and_send(poll_sec: float = 0.3):
                     signature=last_sig,
                     note="startup_status",
                 )
-                sms_client.send_text(text)
+                scheduler.submit(init_status, text)
                 last_status = init_status
                 print(f"[INIT] Startup decision logged: {init_status}")
+        checkpoint()
 
     while True:
         try:
-            row = read_latest_row(CSV_PATH)
+            # Cheap poll: only re-read when the CSV or its snapshot changed
+            stamp = (
+                watcher_state.file_stamp(csv_path),
+                watcher_state.file_stamp(status_snapshot.snapshot_path_for(csv_path)),
+            )
+            if stamp == last_stamp:
+                time.sleep(poll_sec)
+                continue
+
+            row = read_row()
             sig = latest_row_signature(row)
             if sig is None:
                 time.sleep(poll_sec)
@@ -283,7 +476,7 @@ def watch_csv_and_send(poll_sec: float = 0.3):
                             if last_status != "SAFE":
                                 # --- LOG SAFE transition trigger ---
                                 log_event(
-                                    EVENTS_LOG_PATH,
+                                    events_log_path,
                                     now_iso(),
                                     src_ts,
                                     status,
@@ -294,7 +487,7 @@ def watch_csv_and_send(poll_sec: float = 0.3):
                                 )
                                 text = make_message(status, level)
                                 if text:
-                                    sms_client.send_text(text)
+                                    scheduler.submit(status, text)
                                 last_status = status
                             else:
                                 print("[WATCH] Still SAFE → not sending.")
@@ -303,7 +496,7 @@ def watch_csv_and_send(poll_sec: float = 0.3):
                             if status != last_status:
                                 # --- LOG WARNING/DANGER transition trigger ---
                                 log_event(
-                                    EVENTS_LOG_PATH,
+                                    events_log_path,
                                     now_iso(),
                                     src_ts,
                                     status,
@@ -314,14 +507,14 @@ def watch_csv_and_send(poll_sec: float = 0.3):
                                 )
                                 text = make_message(status, level)
                                 if text:
-                                    sms_client.send_text(text)
+                                    scheduler.submit(status, text)
                                 last_status = status
                             else:
                                 print("[WATCH] Status unchanged → not sending.")
                     else:
                         # Always send/log on any change to the row
                         log_event(
-                            EVENTS_LOG_PATH,
+                            events_log_path,
                             now_iso(),
                             src_ts,
                             status,
@@ -332,16 +525,24 @@ def watch_csv_and_send(poll_sec: float = 0.3):
                         )
                         text = make_message(status, level)
                         if text:
-                            sms_client.send_text(text)
+                            scheduler.submit(status, text)
                         last_status = status
 
                     last_sig = sig
                 else:
                     print("[WATCH] Missing status or level in latest row → skipping.")
                     last_sig = sig
+                checkpoint()
+
+            # Only skip future polls once this stamp was read and handled; a failed
+            # read (e.g. Windows sharing violation) is retried on the next poll.
+            last_stamp = stamp
 
         except Exception as e:
             print("[WATCH] Unexpected error:", repr(e))
+        finally:
+            # No-op after the first poll (see above)
+            scheduler.start()
 
         time.sleep(poll_sec)
 
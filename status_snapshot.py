@@ -0,0 +1,230 @@
+"""
+Current-status snapshot shared between the sensor writer and the readers.
+
+The snapshot is a single fixed-size binary record holding the latest and the
+previous status row (timestamp, report, water_level_m). The writer publishes it
+by writing a temp file next to the target and renaming it over the old one, so
+a reader always sees either the old or the new record, never a partial one.
+
+Readers (sms.py watcher, ussd.py menu) prefer the snapshot and fall back to
+parsing the status CSV when the snapshot is missing or older than the CSV.
+
+Sensor-side entry points (run after each status write):
+
+    python status_snapshot.py publish <status_csv> <timestamp> <report> <water_level_m>
+    python status_snapshot.py sync <status_csv>    # re-publish from the CSV's last two rows
+"""
+import os
+import csv
+import sys
+import struct
+import tempfile
+import time
+from collections import deque
+from typing import Optional, Dict, Any, Tuple
+
+# ---------- Record layout ----------
+# magic | row count | latest (ts, report, level) | previous (ts, report, level)
+MAGIC = b"AKS1"
+_TS_LEN = 40
+_REPORT_LEN = 16
+_LEVEL_LEN = 16
+_RECORD = struct.Struct(
+    f"<4sB{_TS_LEN}s{_REPORT_LEN}s{_LEVEL_LEN}s{_TS_LEN}s{_REPORT_LEN}s{_LEVEL_LEN}s"
+)
+RECORD_SIZE = _RECORD.size
+
+Row = Dict[str, Any]
+
+
+# ---------- Paths ----------
+def snapshot_path_for(csv_path: str) -> str:
+    """STATUS_SNAPSHOT_PATH if set, else the CSV path with a .snap extension."""
+    override = os.getenv("STATUS_SNAPSHOT_PATH")
+    if override:
+        return override
+    return os.path.splitext(csv_path)[0] + ".snap"
+
+
+# ---------- Encoding ----------
+def _pack_field(value: Any, size: int) -> bytes:
+    return str(value or "").strip().encode("utf-8")[:size]
+
+
+def _unpack_field(raw: bytes) -> str:
+    return raw.rstrip(b"\x00").decode("utf-8", errors="replace")
+
+
+def _pack(latest: Optional[Row], previous: Optional[Row]) -> bytes:
+    rows = [r for r in (latest, previous) if r]
+    fields = []
+    for r in (latest, previous):
+        r = r or {}
+        fields += [
+            _pack_field(r.get("timestamp"), _TS_LEN),
+            _pack_field(r.get("report"), _REPORT_LEN),
+            _pack_field(r.get("water_level_m"), _LEVEL_LEN),
+        ]
+    return _RECORD.pack(MAGIC, len(rows), *fields)
+
+
+def _unpack(data: bytes) -> Optional[Tuple[Optional[Row], Optional[Row]]]:
+    if len(data) != RECORD_SIZE:
+        return None
+    magic, count, *fields = _RECORD.unpack(data)
+    if magic != MAGIC:
+        return None
+    values = [_unpack_field(v) for v in fields]
+    latest = {
+        "timestamp": values[0],
+        "report": values[1],
+        "water_level_m": values[2],
+    }
+    previous = {
+        "timestamp": values[3],
+        "report": values[4],
+        "water_level_m": values[5],
+    }
+    return (latest if count >= 1 else None, previous if count >= 2 else None)
+
+
+# ---------- Writer ----------
+def atomic_write(path: str, data: bytes):
+    """Replace path with data via a temp file + rename (never a partial file)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # On Windows the rename fails while a reader holds the file open;
+        # readers only keep it open for one read() so a short retry is enough.
+        for attempt in range(5):
+            try:
+                os.replace(tmp_path, path)
+                break
+            except PermissionError:
+                if attempt == 4:
+                    raise
+                time.sleep(0.01)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def publish_snapshot(path: str, latest: Optional[Row], previous: Optional[Row] = None):
+    """Atomically replace the snapshot at path with (latest, previous)."""
+    atomic_write(path, _pack(latest, previous))
+
+
+def publish_status(path: str, row: Row):
+    """
+    Publish a new latest row; the current latest becomes the previous one.
+    Re-publishing the row that is already latest leaves the previous untouched.
+    """
+    current = read_snapshot(path)
+    latest, previous = current if current else (None, None)
+    new_row = {
+        "timestamp": str(row.get("timestamp") or "").strip(),
+        "report": str(row.get("report") or "").strip(),
+        "water_level_m": str(row.get("water_level_m") or "").strip(),
+    }
+    if latest != new_row:
+        previous = latest
+    publish_snapshot(path, new_row, previous)
+
+
+def publish_from_csv(csv_path: str) -> bool:
+    """
+    Publish the last two non-empty rows of csv_path as the snapshot.
+    For writers that only append to the CSV; call it right after each write.
+    Returns False if the CSV has no data rows.
+    """
+    rows = deque(maxlen=2)
+    with open(csv_path, "r", newline="", encoding="utf-8") as f:
+        for r in csv.DictReader(f):
+            row = {
+                "timestamp": (r.get("timestamp") or "").strip(),
+                "report": (r.get("report") or "").strip(),
+                "water_level_m": (r.get("water_level_m") or "").strip(),
+            }
+            if any(row.values()):
+                rows.append(row)
+    if not rows:
+        return False
+    publish_snapshot(
+        snapshot_path_for(csv_path), rows[-1], rows[0] if len(rows) == 2 else None
+    )
+    return True
+
+
+# ---------- Readers ----------
+def read_snapshot(path: str) -> Optional[Tuple[Optional[Row], Optional[Row]]]:
+    """Return (latest, previous) from the snapshot, or None if unavailable."""
+    try:
+        with open(path, "rb") as f:
+            return _unpack(f.read(RECORD_SIZE + 1))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[SNAPSHOT] Error reading {path}: {e}")
+        return None
+
+
+def read_snapshot_for(csv_path: str) -> Optional[Tuple[Optional[Row], Optional[Row]]]:
+    """
+    Snapshot for csv_path, or None when it is missing or older than the CSV
+    (i.e. the writer updated the CSV without publishing a snapshot).
+    """
+    snap_path = snapshot_path_for(csv_path)
+    try:
+        snap_mtime = os.stat(snap_path).st_mtime_ns
+    except OSError:
+        return None
+    try:
+        if os.stat(csv_path).st_mtime_ns > snap_mtime:
+            return None
+    except OSError:
+        pass
+    return read_snapshot(snap_path)
+
+
+# ---------- CLI (sensor side) ----------
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Publish the current-status snapshot."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", help="publish one new latest row")
+    pub.add_argument("csv_path")
+    pub.add_argument("timestamp")
+    pub.add_argument("report")
+    pub.add_argument("water_level_m")
+    sync = sub.add_parser("sync", help="publish the last two rows of the CSV")
+    sync.add_argument("csv_path")
+    args = parser.parse_args(argv)
+
+    if args.command == "publish":
+        publish_status(
+            snapshot_path_for(args.csv_path),
+            {
+                "timestamp": args.timestamp,
+                "report": args.report,
+                "water_level_m": args.water_level_m,
+            },
+        )
+        return 0
+    if not publish_from_csv(args.csv_path):
+        print(f"[SNAPSHOT] No data rows in {args.csv_path}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,20 @@
+import os
+import sys
+
+# Modules live at the repo root (flat layout)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import settings
+
+
+@pytest.fixture
+def override_settings(monkeypatch):
+    """Replace fields of the cached Settings for one test."""
+
+    def apply(**fields):
+        current = settings.load_settings()
+        monkeypatch.setattr(settings, "_settings", current._replace(**fields))
+
+    return apply
@@ -0,0 +1,292 @@
+import threading
+import time
+
+from alert_scheduler import AlertScheduler
+
+RECIPIENTS = ["+27821234567", "+27822345678", "+27823456789", "+27824567890"]
+
+
+class RecordingClient:
+    """Records sends; optionally blocks the first send until released."""
+
+    def __init__(self, block_first=False):
+        self.sent = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not block_first:
+            self.release.set()
+
+    def send_text(self, text, recipients=None):
+        self.started.set()
+        self.release.wait(5)
+        self.sent.append((time.monotonic(), text, list(recipients)))
+
+    def texts(self):
+        return [text for _, text, _ in self.sent]
+
+
+def make_scheduler(client, **kwargs):
+    kwargs.setdefault("batch_size", 1)
+    kwargs.setdefault("class_intervals", {"DANGER": 0, "WARNING": 0, "SAFE": 0})
+    kwargs.setdefault("provider_interval", 0)
+    return AlertScheduler(client, RECIPIENTS, **kwargs)
+
+
+def test_danger_preempts_queued_lower_severity():
+    client = RecordingClient(block_first=True)
+    scheduler = make_scheduler(client)
+    scheduler.start()
+    try:
+        scheduler.submit("WARNING", "warn")
+        assert client.started.wait(5)
+        # Queued behind the in-flight WARNING batch without superseding anything
+        scheduler.submit("SAFE", "safe", supersede=False)
+        scheduler.submit("DANGER", "danger", supersede=False)
+        client.release.set()
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop()
+
+    texts = client.texts()
+    assert texts[0] == "warn"  # already in flight
+    assert texts[1:5] == ["danger"] * 4
+    assert texts[5:8] == ["warn"] * 3
+    assert texts[8:] == ["safe"] * 4
+
+
+def test_new_alert_supersedes_equal_or_lower_severity():
+    client = RecordingClient(block_first=True)
+    scheduler = make_scheduler(client)
+    scheduler.start()
+    try:
+        scheduler.submit("SAFE", "safe")
+        assert client.started.wait(5)
+        cancelled = scheduler.submit("DANGER", "danger")
+        client.release.set()
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop()
+
+    assert cancelled == 3  # the in-flight SAFE batch is not cancelled
+    assert client.texts() == ["safe"] + ["danger"] * 4
+
+
+def test_lower_severity_does_not_drop_queued_danger():
+    client = RecordingClient(block_first=True)
+    scheduler = make_scheduler(client)
+    scheduler.start()
+    try:
+        scheduler.submit("DANGER", "danger")
+        assert client.started.wait(5)
+        cancelled = scheduler.submit("SAFE", "safe")
+        client.release.set()
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop()
+
+    assert cancelled == 0
+    assert client.texts() == ["danger"] * 4 + ["safe"] * 4
+
+
+def test_per_class_rate_limit():
+    client = RecordingClient()
+    scheduler = make_scheduler(
+        client, class_intervals={"DANGER": 0, "WARNING": 0, "SAFE": 0.1}
+    )
+    scheduler.start()
+    try:
+        scheduler.submit("SAFE", "safe")
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop()
+
+    times = [t for t, _, _ in client.sent]
+    assert len(times) == 4
+    assert all(b - a >= 0.09 for a, b in zip(times, times[1:]))
+
+
+def test_rate_limited_class_does_not_hold_back_danger():
+    client = RecordingClient()
+    scheduler = make_scheduler(
+        client, class_intervals={"DANGER": 0, "WARNING": 0, "SAFE": 10}
+    )
+    scheduler.start()
+    try:
+        scheduler.submit("SAFE", "safe")
+        deadline = time.monotonic() + 5
+        while not client.sent and time.monotonic() < deadline:
+            time.sleep(0.01)
+        scheduler.submit("SAFE", "safe again", supersede=False)
+        scheduler.submit("DANGER", "danger", supersede=False)
+        deadline = time.monotonic() + 5
+        while client.texts().count("danger") < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.stop()
+
+    assert client.texts() == ["safe"] + ["danger"] * 4
+
+
+def test_provider_rate_limit_spans_classes():
+    client = RecordingClient()
+    scheduler = make_scheduler(client, provider_interval=0.1)
+    scheduler.start()
+    try:
+        scheduler.submit("DANGER", "danger", recipients=RECIPIENTS[:2])
+        scheduler.submit(
+            "WARNING", "warn", recipients=RECIPIENTS[:2], supersede=False
+        )
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop()
+
+    times = [t for t, _, _ in client.sent]
+    assert client.texts() == ["danger", "danger", "warn", "warn"]
+    assert all(b - a >= 0.09 for a, b in zip(times, times[1:]))
+
+
+def test_pending_jobs_include_in_flight_and_restore():
+    client = RecordingClient(block_first=True)
+    scheduler = make_scheduler(client, batch_size=2)
+    scheduler.start()
+    scheduler.submit("DANGER", "danger")
+    assert client.started.wait(5)
+    pending = scheduler.pending_jobs()
+    assert [job["recipients"] for job in pending] == [RECIPIENTS[:2], RECIPIENTS[2:]]
+
+    # A restarted process replays exactly the unsent batches
+    replay_client = RecordingClient()
+    replay = make_scheduler(replay_client, batch_size=2)
+    replay.restore(pending)
+    replay.start()
+    try:
+        assert replay.flush(5)
+    finally:
+        replay.stop()
+        client.release.set()
+        scheduler.stop(timeout=5)
+    assert [r for _, _, r in replay_client.sent] == [RECIPIENTS[:2], RECIPIENTS[2:]]
+
+
+def test_stop_with_drain_sends_queued_batches():
+    client = RecordingClient()
+    scheduler = make_scheduler(
+        client, class_intervals={"DANGER": 0.05, "WARNING": 0, "SAFE": 0}
+    )
+    scheduler.start()
+    scheduler.submit("DANGER", "danger")
+    scheduler.stop(drain=True, timeout=5)
+    assert client.texts() == ["danger"] * 4
+    assert scheduler.pending() == 0
+
+
+def test_on_sent_called_after_each_batch():
+    client = RecordingClient()
+    seen = []
+    scheduler = make_scheduler(client, batch_size=2, on_sent=seen.append)
+    scheduler.start()
+    try:
+        scheduler.submit("WARNING", "warn")
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop(timeout=5)
+    assert [job["status"] for job in seen] == ["WARNING", "WARNING"]
+
+
+class FailingClient(RecordingClient):
+    """Raises for the first `failures` sends (optionally naming the recipients)."""
+
+    def __init__(self, failures, rejected=None):
+        super().__init__()
+        self.failures = failures
+        self.rejected = rejected
+        self.attempts = []
+
+    def send_text(self, text, recipients=None):
+        self.attempts.append((text, list(recipients)))
+        if len(self.attempts) <= self.failures:
+            error = RuntimeError("provider unavailable")
+            error.recipients = self.rejected
+            raise error
+        return super().send_text(text, recipients)
+
+
+def test_failed_send_is_retried_with_backoff():
+    client = FailingClient(failures=2)
+    seen = []
+    scheduler = make_scheduler(
+        client, batch_size=4, on_sent=seen.append, retry_base=0.05, retry_max=1
+    )
+    scheduler.start()
+    try:
+        scheduler.submit("DANGER", "danger")
+        deadline = time.monotonic() + 5
+        while not client.attempts and time.monotonic() < deadline:
+            time.sleep(0.01)
+        # Still queued (and in pending_jobs) after the failure
+        assert scheduler.pending_jobs()[0]["status"] == "DANGER"
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop()
+
+    assert len(client.attempts) == 3
+    assert client.texts() == ["danger"]
+    assert [job["status"] for job in seen] == ["DANGER"]
+
+
+def test_failed_send_is_not_reported_as_sent():
+    client = FailingClient(failures=100)
+    seen = []
+    scheduler = make_scheduler(client, on_sent=seen.append, retry_base=10)
+    scheduler.start()
+    try:
+        scheduler.submit("DANGER", "danger", recipients=RECIPIENTS[:1])
+        assert not scheduler.flush(0.3)
+    finally:
+        scheduler.stop()
+    assert scheduler.pending() == 1
+    assert seen == []
+
+
+def test_only_rejected_recipients_are_retried():
+    client = FailingClient(failures=1, rejected=[RECIPIENTS[1]])
+    scheduler = make_scheduler(client, batch_size=2, retry_base=0.01)
+    scheduler.start()
+    try:
+        scheduler.submit("WARNING", "warn", recipients=RECIPIENTS[:2])
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop()
+    assert [r for _, r in client.attempts] == [RECIPIENTS[:2], [RECIPIENTS[1]]]
+
+
+def test_failed_danger_holds_back_lower_severity():
+    client = FailingClient(failures=1)
+    scheduler = make_scheduler(client, batch_size=4, retry_base=0.2)
+    scheduler.start()
+    try:
+        scheduler.submit("DANGER", "danger")
+        deadline = time.monotonic() + 5
+        while not client.attempts and time.monotonic() < deadline:
+            time.sleep(0.01)
+        scheduler.submit("SAFE", "safe")
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop()
+    assert client.texts() == ["danger", "safe"]
+
+
+def test_suppressed_send_is_dropped_without_on_sent():
+    class DryRunClient:
+        def send_text(self, text, recipients=None):
+            return False
+
+    seen = []
+    scheduler = make_scheduler(DryRunClient(), on_sent=seen.append)
+    scheduler.start()
+    try:
+        scheduler.submit("SAFE", "safe")
+        assert scheduler.flush(5)
+    finally:
+        scheduler.stop()
+    assert seen == []
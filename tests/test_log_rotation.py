@@ -0,0 +1,222 @@
+import csv
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import log_rotation
+
+HEADERS = ["ts_iso", "worker", "n"]
+
+
+def _all_rows(path):
+    return list(log_rotation.iter_rows(str(path)))
+
+
+def test_concurrent_appends_survive_rotation(
+    tmp_path, monkeypatch, override_settings
+):
+    override_settings(log_max_bytes=2000, log_max_age_sec=0, log_archive_dir="")
+    # Keep the background archivers asleep; archive explicitly below
+    monkeypatch.setattr(log_rotation, "ARCHIVE_GRACE_SEC", 60)
+    path = tmp_path / "ussd_logs.csv"
+
+    def worker(w):
+        for n in range(500):
+            row = ["2025-10-05T15:24:00.000000Z", w, n]
+            log_rotation.append_row(str(path), HEADERS, row)
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    log_rotation.archive_pending(str(path))
+
+    rows = _all_rows(path)
+    assert len(rows) == 8 * 500
+    assert len({(r["worker"], r["n"]) for r in rows}) == 8 * 500
+    assert len(log_rotation.read_index(str(path))) > 1
+
+
+def test_fresh_segment_has_header(tmp_path, override_settings):
+    override_settings(log_max_bytes=100, log_max_age_sec=0, log_archive_dir="")
+    path = tmp_path / "events_log.csv"
+    for n in range(10):
+        log_rotation.append_row(str(path), HEADERS, ["2025-10-08T12:00:00Z", 0, n])
+    with open(path, newline="", encoding="utf-8") as f:
+        assert next(csv.reader(f)) == HEADERS
+
+
+def test_stale_start_cache_after_rotation_elsewhere(tmp_path, override_settings):
+    # Another worker rotated the file: our cached (expired) start time must not
+    # make this process rotate the fresh segment again.
+    override_settings(
+        log_max_bytes=1 << 20, log_max_age_sec=3600, log_archive_dir=""
+    )
+    path = tmp_path / "ussd_logs.csv"
+    log_rotation.append_row(str(path), HEADERS, ["2020-01-01T00:00:00Z", 0, 0])
+    st = path.stat()
+    log_rotation._active_started[str(path)] = (
+        st.st_ino,
+        st.st_size,
+        log_rotation._parse_ts("2020-01-01T00:00:00Z"),
+    )
+
+    fresh = tmp_path / "fresh.csv"
+    with open(fresh, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(HEADERS)
+        w.writerow([time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), 1, 0])
+    fresh.replace(path)
+
+    assert log_rotation.rotate_if_needed(str(path), HEADERS) is False
+
+
+def test_headerless_legacy_log_keeps_every_row(tmp_path, override_settings):
+    # events_log.csv predates the header row: its first line is data
+    from sms import EVENTS_LOG_HEADERS
+
+    override_settings(log_max_bytes=1000, log_max_age_sec=0, log_archive_dir="")
+    legacy = os.path.join(os.path.dirname(os.path.dirname(__file__)), "events_log.csv")
+    path = tmp_path / "events_log.csv"
+    shutil.copyfile(legacy, path)
+    with open(legacy, newline="", encoding="utf-8") as f:
+        legacy_rows = [r for r in csv.reader(f) if r]
+
+    # Before any rotation the active log is read with the given headers
+    rows = list(log_rotation.iter_rows(str(path), headers=EVENTS_LOG_HEADERS))
+    assert [r["detection_time_iso"] for r in rows] == [r[0] for r in legacy_rows]
+
+    new_row = ["2025-10-19T00:00:00Z", "", "SAFE", "0.400", "", "sig", "test"]
+    log_rotation.append_row(str(path), EVENTS_LOG_HEADERS, new_row)
+    log_rotation.archive_pending(str(path), headers=EVENTS_LOG_HEADERS)
+
+    (entry,) = log_rotation.read_index(str(path))
+    assert entry["rows"] == str(len(legacy_rows))
+    assert entry["first_ts"] == legacy_rows[0][0]
+    assert entry["last_ts"] == legacy_rows[-1][0]
+
+    rows = _all_rows(path)
+    assert set(rows[0]) == set(EVENTS_LOG_HEADERS)
+    assert [r["detection_time_iso"] for r in rows] == [r[0] for r in legacy_rows] + [
+        new_row[0]
+    ]
+
+
+def test_append_survives_rotation_failure(tmp_path, override_settings):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    override_settings(
+        log_max_bytes=10, log_max_age_sec=0, log_archive_dir=str(blocker / "archive")
+    )
+    path = tmp_path / "events_log.csv"
+    for n in range(3):
+        log_rotation.append_row(str(path), HEADERS, ["2025-10-08T12:00:00Z", 0, n])
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == HEADERS
+    assert [r[2] for r in rows[1:]] == ["0", "1", "2"]
+
+
+def test_failed_swap_restores_moved_segment(tmp_path, monkeypatch, override_settings):
+    # No hard links, and the fresh segment cannot be renamed into place
+    override_settings(log_max_bytes=10, log_max_age_sec=0, log_archive_dir="")
+    path = tmp_path / "events_log.csv"
+    log_rotation.append_row(str(path), HEADERS, ["2025-10-08T12:00:00Z", 0, 0])
+
+    real_replace = os.replace
+
+    def no_link(src, dst):
+        raise OSError("hard links not supported")
+
+    def replace(src, dst):
+        if os.path.basename(src).startswith(".tmp-") and dst == str(path):
+            raise PermissionError("file in use")
+        return real_replace(src, dst)
+
+    with monkeypatch.context() as m:
+        m.setattr(log_rotation.os, "link", no_link)
+        m.setattr(log_rotation.os, "replace", replace)
+        assert log_rotation.rotate_if_needed(str(path), HEADERS) is False
+
+    with open(path, newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [HEADERS, ["2025-10-08T12:00:00Z", "0", "0"]]
+    assert os.listdir(tmp_path / "archive") == []
+    assert not [n for n in os.listdir(tmp_path) if n.startswith(".tmp-")]
+
+
+def _closed_segments(tmp_path, count, rows_each):
+    archive = tmp_path / "archive"
+    archive.mkdir()
+    for seg in range(count):
+        name = f"ussd_logs-2025100{seg}T000000000000Z.csv{log_rotation.CLOSING_SUFFIX}"
+        with open(archive / name, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(HEADERS)
+            for n in range(rows_each):
+                w.writerow([f"2025-10-0{seg}T00:00:{n:02d}Z", seg, n])
+    return archive
+
+
+def test_concurrent_archivers_claim_each_segment_once(tmp_path, override_settings):
+    override_settings(log_archive_dir="")
+    archive = _closed_segments(tmp_path, count=9, rows_each=2000)
+    path = tmp_path / "ussd_logs.csv"
+    script = "import sys, log_rotation; log_rotation.archive_pending(sys.argv[1])"
+    env = dict(os.environ, LOG_ARCHIVE_DIR="")
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-c", script, str(path)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env,
+        )
+        for _ in range(4)
+    ]
+    for p in procs:
+        assert p.wait(30) == 0
+
+    index = log_rotation.read_index(str(path))
+    assert len(index) == 9
+    assert len({e["segment"] for e in index}) == 9
+    assert sorted(os.listdir(archive)) == sorted(
+        [e["segment"] for e in index] + ["ussd_logs.index.csv"]
+    )
+    assert len(_all_rows(path)) == 9 * 2000
+
+
+def test_stale_claim_is_taken_over(tmp_path, override_settings):
+    override_settings(log_archive_dir="")
+    archive = _closed_segments(tmp_path, count=2, rows_each=3)
+    stale, live = sorted(os.listdir(archive))
+    old = int(time.time() - log_rotation.ARCHIVE_STALE_SEC - 10)
+    base = stale[: -len(log_rotation.CLOSING_SUFFIX)]
+    os.rename(archive / stale, archive / f"{base}{log_rotation.ARCHIVING_SUFFIX}{old}")
+    live_base = live[: -len(log_rotation.CLOSING_SUFFIX)]
+    busy = f"{live_base}{log_rotation.ARCHIVING_SUFFIX}{int(time.time())}"
+    os.rename(archive / live, archive / busy)
+
+    path = tmp_path / "ussd_logs.csv"
+    log_rotation.archive_pending(str(path))
+    assert [e["segment"] for e in log_rotation.read_index(str(path))] == [
+        base + ".gz"
+    ]
+    assert busy in os.listdir(archive)  # still claimed by a live worker
+
+
+def test_first_append_sweeps_leftover_segments(
+    tmp_path, monkeypatch, override_settings
+):
+    override_settings(log_max_bytes=1 << 20, log_max_age_sec=0, log_archive_dir="")
+    monkeypatch.setattr(log_rotation, "ARCHIVE_GRACE_SEC", 0)
+    _closed_segments(tmp_path, count=1, rows_each=3)
+    path = tmp_path / "ussd_logs.csv"
+    log_rotation.append_row(str(path), HEADERS, ["2025-10-19T00:00:00Z", 0, 0])
+
+    deadline = time.monotonic() + 5
+    while not log_rotation.read_index(str(path)) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(log_rotation.read_index(str(path))) == 1
+    assert len(_all_rows(path)) == 4
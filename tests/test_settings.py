@@ -0,0 +1,26 @@
+import pytest
+
+import settings
+import sms
+
+
+def test_former_constants_read_settings(override_settings):
+    override_settings(csv_path="/data/status_current.csv", at_api_key="key")
+    assert sms.CSV_PATH == "/data/status_current.csv"
+    assert sms.AT_API_KEY == "key"
+    from sms import EVENTS_LOG_PATH
+
+    assert EVENTS_LOG_PATH == settings.load_settings().events_log_path
+
+
+def test_assigning_former_constant_raises():
+    with pytest.raises(AttributeError, match="environment variable"):
+        sms.CSV_PATH = "/elsewhere.csv"
+    assert sms.CSV_PATH == settings.load_settings().csv_path
+
+
+def test_other_module_attributes_stay_assignable(monkeypatch):
+    monkeypatch.setattr(sms, "SEND_ENABLED", False)
+    assert sms.SEND_ENABLED is False
+    with pytest.raises(AttributeError):
+        sms.NOT_A_SETTING
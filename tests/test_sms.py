@@ -0,0 +1,78 @@
+import pytest
+
+import sms
+
+pytest.importorskip("requests")
+
+
+class FakeResponse:
+    status_code = 201
+
+    def __init__(self, data):
+        self.data = data
+        self.text = str(data)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+@pytest.fixture
+def client(monkeypatch, override_settings):
+    override_settings(at_api_key="key", at_username="sandbox")
+    monkeypatch.setattr(sms, "_http_configured", True)  # leave os.environ alone
+    c = sms.SMS()
+    c.posts = []
+
+    def post(url, data=None, headers=None, timeout=None):
+        c.posts.append(data)
+        return c.response
+
+    monkeypatch.setattr(c.session, "post", post)
+    return c
+
+
+def recipients_status(codes):
+    return {
+        "SMSMessageData": {
+            "Message": "Sent to 1/2",
+            "Recipients": [
+                {"number": number, "statusCode": code}
+                for number, code in zip(sms.RECIPIENTS, codes)
+            ],
+        }
+    }
+
+
+def test_accepted_by_provider(client):
+    client.response = FakeResponse(recipients_status([101, 102, 100]))
+    assert client.send_text("hello") is True
+
+
+def test_rejected_recipients_raise(client):
+    client.response = FakeResponse(recipients_status([101, 403, 101]))
+    with pytest.raises(sms.SMSSendError) as err:
+        client.send_text("hello")
+    assert err.value.recipients == [sms.RECIPIENTS[1]]
+
+
+def test_network_error_raises_for_all(client, monkeypatch):
+    def down(*args, **kwargs):
+        raise ConnectionError("down")
+
+    monkeypatch.setattr(client.session, "post", down)
+    with pytest.raises(sms.SMSSendError) as err:
+        client.send_text("hello")
+    assert err.value.recipients == sms.RECIPIENTS
+
+
+def test_dry_run_and_missing_key_are_not_sent(client, monkeypatch):
+    monkeypatch.setattr(sms, "SEND_ENABLED", False)
+    assert client.send_text("hello") is False
+    monkeypatch.setattr(sms, "SEND_ENABLED", True)
+    client.api_key = None
+    with pytest.raises(sms.SMSSendError):
+        client.send_text("hello")
+    assert client.posts == []
@@ -0,0 +1,45 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Importing a module must not read config, load these packages, touch the
+# environment or create files; all of that waits until first use.
+DEFERRED = ["requests", "dotenv"]
+
+PROBE = """
+import json, os, sys
+before = dict(os.environ)
+import {module}
+import settings
+print(json.dumps({{
+    "loaded": [m for m in {deferred!r} if m in sys.modules],
+    "settings_loaded": settings._settings is not None,
+    "env_changed": dict(os.environ) != before,
+}}))
+"""
+
+
+@pytest.mark.parametrize(
+    "module", ["settings", "status_snapshot", "log_rotation", "sms", "ussd", "main"]
+)
+def test_import_has_no_side_effects(module, tmp_path):
+    if module in ("ussd", "main") and importlib.util.find_spec("flask") is None:
+        pytest.skip("flask not installed")
+    env = dict(os.environ, PYTHONPATH=REPO, HTTP_PROXY="http://proxy:3128")
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, deferred=DEFERRED)],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert result == {"loaded": [], "settings_loaded": False, "env_changed": False}
+    assert os.listdir(tmp_path) == []  # e.g. no ussd_logs.csv
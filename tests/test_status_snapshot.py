@@ -0,0 +1,132 @@
+import csv
+import os
+
+import pytest
+
+import status_snapshot
+
+LATEST = {
+    "timestamp": "2025-10-09T16:59:30.649Z",
+    "report": "SAFE",
+    "water_level_m": "0.412",
+}
+PREVIOUS = {
+    "timestamp": "2025-10-09T16:59:26.341Z",
+    "report": "WARNING",
+    "water_level_m": "0.600",
+}
+
+
+@pytest.fixture(autouse=True)
+def no_snapshot_override(monkeypatch):
+    monkeypatch.delenv("STATUS_SNAPSHOT_PATH", raising=False)
+
+
+def write_status_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["timestamp", "report", "water_level_m"])
+        for r in rows:
+            w.writerow([r["timestamp"], r["report"], r["water_level_m"]])
+
+
+def make_older(path, than):
+    st = os.stat(than)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - 10**9))
+
+
+def test_pack_unpack_round_trip(tmp_path):
+    snap = tmp_path / "status.snap"
+    status_snapshot.publish_snapshot(str(snap), LATEST, PREVIOUS)
+    assert snap.stat().st_size == status_snapshot.RECORD_SIZE
+    assert status_snapshot.read_snapshot(str(snap)) == (LATEST, PREVIOUS)
+
+    status_snapshot.publish_snapshot(str(snap), LATEST)
+    assert status_snapshot.read_snapshot(str(snap)) == (LATEST, None)
+
+
+def test_fields_are_truncated_to_record_size(tmp_path):
+    snap = tmp_path / "status.snap"
+    row = {"timestamp": "T" * 100, "report": "R" * 100, "water_level_m": "9" * 100}
+    status_snapshot.publish_snapshot(str(snap), row)
+    latest, previous = status_snapshot.read_snapshot(str(snap))
+    assert latest == {
+        "timestamp": "T" * status_snapshot._TS_LEN,
+        "report": "R" * status_snapshot._REPORT_LEN,
+        "water_level_m": "9" * status_snapshot._LEVEL_LEN,
+    }
+    assert previous is None
+    assert snap.stat().st_size == status_snapshot.RECORD_SIZE
+
+
+def test_corrupt_snapshot_is_ignored(tmp_path):
+    snap = tmp_path / "status.snap"
+    snap.write_bytes(b"XXXX" + b"\x00" * (status_snapshot.RECORD_SIZE - 4))
+    assert status_snapshot.read_snapshot(str(snap)) is None
+    snap.write_bytes(b"AKS1")
+    assert status_snapshot.read_snapshot(str(snap)) is None
+
+
+def test_publish_status_moves_latest_to_previous(tmp_path):
+    snap = str(tmp_path / "status.snap")
+    status_snapshot.publish_status(snap, PREVIOUS)
+    assert status_snapshot.read_snapshot(snap) == (PREVIOUS, None)
+
+    status_snapshot.publish_status(snap, LATEST)
+    assert status_snapshot.read_snapshot(snap) == (LATEST, PREVIOUS)
+
+    # Re-publishing the same latest row keeps the previous one
+    status_snapshot.publish_status(snap, dict(LATEST))
+    assert status_snapshot.read_snapshot(snap) == (LATEST, PREVIOUS)
+
+
+def test_publish_from_csv_uses_last_two_rows(tmp_path):
+    csv_path = tmp_path / "status_current.csv"
+    older = {
+        "timestamp": "2025-10-08T12:02:33.825Z",
+        "report": "SAFE",
+        "water_level_m": "0.394",
+    }
+    write_status_csv(csv_path, [older, PREVIOUS, LATEST])
+    assert status_snapshot.publish_from_csv(str(csv_path)) is True
+    assert status_snapshot.read_snapshot_for(str(csv_path)) == (LATEST, PREVIOUS)
+
+    write_status_csv(csv_path, [])
+    assert status_snapshot.publish_from_csv(str(csv_path)) is False
+
+
+def test_read_snapshot_for_falls_back_when_older_than_csv(tmp_path):
+    csv_path = tmp_path / "status_current.csv"
+    write_status_csv(csv_path, [PREVIOUS, LATEST])
+    snap = status_snapshot.snapshot_path_for(str(csv_path))
+    assert snap == str(tmp_path / "status_current.snap")
+    assert status_snapshot.read_snapshot_for(str(csv_path)) is None
+
+    status_snapshot.publish_snapshot(snap, LATEST, PREVIOUS)
+    os.utime(snap, ns=(csv_path.stat().st_atime_ns, csv_path.stat().st_mtime_ns))
+    assert status_snapshot.read_snapshot_for(str(csv_path)) == (LATEST, PREVIOUS)
+
+    # The CSV was written after the snapshot: readers must parse the CSV
+    make_older(snap, csv_path)
+    assert status_snapshot.read_snapshot_for(str(csv_path)) is None
+
+
+def test_ussd_tail_status_rows_reads_snapshot(tmp_path):
+    pytest.importorskip("flask")
+    import ussd
+
+    csv_path = tmp_path / "status_current.csv"
+    # The CSV holds different rows, so a CSV read would be noticed
+    stale = {
+        "timestamp": "2025-10-01T00:00:00Z",
+        "report": "danger",
+        "water_level_m": "1.0",
+    }
+    write_status_csv(csv_path, [stale, stale])
+    snap = status_snapshot.snapshot_path_for(str(csv_path))
+    status_snapshot.publish_snapshot(snap, dict(LATEST, report="safe"), PREVIOUS)
+    make_older(csv_path, snap)
+
+    assert ussd._tail_status_rows(str(csv_path), n=1) == [LATEST]
+    assert ussd._tail_status_rows(str(csv_path), n=2) == [PREVIOUS, LATEST]
+    assert ussd._tail_status_rows(str(csv_path), n=0) == []
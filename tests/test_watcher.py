@@ -0,0 +1,234 @@
+import csv
+import json
+import os
+import types
+
+import pytest
+
+import sms
+
+HEADER = ["timestamp", "report", "water_level_m"]
+
+
+class StopWatcher(BaseException):
+    """Raised from the patched sleep to leave the watcher loop."""
+
+
+class FakeSMS:
+    sent = []
+
+    def __init__(self):
+        pass
+
+    def send_text(self, text, recipients=None):
+        FakeSMS.sent.append((text, list(recipients)))
+        return True
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(HEADER)
+        w.writerows(rows)
+
+
+def append_csv(path, rows):
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+
+@pytest.fixture
+def watcher(tmp_path, monkeypatch, override_settings):
+    """run() runs the watcher for a few polls and returns the texts it sent."""
+    monkeypatch.delenv("STATUS_SNAPSHOT_PATH", raising=False)
+    override_settings(
+        csv_path=str(tmp_path / "status_current.csv"),
+        events_log_path=str(tmp_path / "events_log.csv"),
+        watcher_state_path=str(tmp_path / "watcher_state.json"),
+        alert_interval_danger=0,
+        alert_interval_warning=0,
+        alert_interval_safe=0,
+        alert_provider_interval_sec=0,
+        log_max_age_sec=0,
+    )
+    monkeypatch.setattr(sms, "SMS", FakeSMS)
+
+    def run(polls=3):
+        FakeSMS.sent = []
+        exit_hooks = []
+        sleeps = []
+
+        def sleep(sec):
+            sleeps.append(sec)
+            if len(sleeps) >= polls:
+                raise StopWatcher()
+
+        monkeypatch.setattr(sms, "time", types.SimpleNamespace(sleep=sleep))
+        monkeypatch.setattr(
+            sms,
+            "atexit",
+            types.SimpleNamespace(
+                register=lambda f, **kw: exit_hooks.append((f, kw))
+            ),
+        )
+        with pytest.raises(StopWatcher):
+            sms.watch_csv_and_send(poll_sec=0)
+        for f, kw in exit_hooks:
+            f(**kw)  # what atexit would do: drain the scheduler
+        return [text for text, _ in FakeSMS.sent]
+
+    run.csv_path = tmp_path / "status_current.csv"
+    run.state_path = tmp_path / "watcher_state.json"
+    return run
+
+
+# ---------- read_latest_row_from ----------
+def test_resume_reads_only_from_offset(tmp_path):
+    path = tmp_path / "status.csv"
+    write_csv(path, [["2025-10-01T00:00:00Z", "SAFE", "0.40"]])
+    row, offset = sms.read_latest_row_from(str(path))
+    assert row["report"] == "SAFE"
+    assert offset == len("timestamp,report,water_level_m\r\n")
+
+    append_csv(path, [["2025-10-01T00:01:00Z", "WARNING", "0.60"]])
+    size_before_last = path.stat().st_size
+    append_csv(path, [["2025-10-01T00:02:00Z", "DANGER", "0.90"]])
+
+    row, new_offset = sms.read_latest_row_from(
+        str(path), offset, sms.latest_row_signature(row)
+    )
+    assert row == {
+        "timestamp": "2025-10-01T00:02:00Z",
+        "report": "DANGER",
+        "water_level_m": "0.90",
+    }
+    assert new_offset == size_before_last
+
+
+def test_resume_rereads_after_rewrite(tmp_path):
+    path = tmp_path / "status.csv"
+    write_csv(
+        path,
+        [
+            ["2025-10-01T00:00:00Z", "SAFE", "0.40"],
+            ["2025-10-01T00:01:00Z", "SAFE", "0.41"],
+        ],
+    )
+    row, offset = sms.read_latest_row_from(str(path))
+    sig = sms.latest_row_signature(row)
+
+    # Rewritten in place: the bytes at offset now hold a different row
+    write_csv(
+        path,
+        [
+            ["2025-10-02T00:00:00Z", "WARNING", "0.60"],
+            ["2025-10-02T00:01:00Z", "DANGER", "0.90"],
+        ],
+    )
+    row, _ = sms.read_latest_row_from(str(path), offset, sig)
+    assert row["timestamp"] == "2025-10-02T00:01:00Z"
+    assert row["report"] == "DANGER"
+
+
+def test_resume_rereads_truncated_file(tmp_path):
+    path = tmp_path / "status.csv"
+    write_csv(path, [[f"2025-10-01T00:0{n}:00Z", "SAFE", "0.40"] for n in range(5)])
+    row, offset = sms.read_latest_row_from(str(path))
+    sig = sms.latest_row_signature(row)
+
+    write_csv(path, [["2025-10-03T00:00:00Z", "WARNING", "0.60"]])
+    assert path.stat().st_size < offset
+    row, new_offset = sms.read_latest_row_from(str(path), offset, sig)
+    assert row["report"] == "WARNING"
+    assert new_offset < offset
+
+
+# ---------- watch_csv_and_send ----------
+def test_first_run_broadcasts_and_checkpoints(watcher):
+    write_csv(watcher.csv_path, [["2025-10-01T00:00:00Z", "SAFE", "0.40"]])
+    texts = watcher()
+    assert len(texts) == 1 and texts[0].startswith("UPDATE:")
+
+    state = json.loads(watcher.state_path.read_text())
+    assert state["last_status"] == "SAFE"
+    assert state["last_sent_status"] == "SAFE"
+    assert state["pending"] == []
+    assert state["inode"] == os.stat(watcher.csv_path).st_ino
+
+
+def test_no_startup_broadcast_when_checkpoint_exists(watcher):
+    write_csv(watcher.csv_path, [["2025-10-01T00:00:00Z", "SAFE", "0.40"]])
+    watcher()
+    assert watcher() == []
+
+
+def test_alerts_when_status_changed_while_down(watcher):
+    write_csv(watcher.csv_path, [["2025-10-01T00:00:00Z", "SAFE", "0.40"]])
+    watcher()
+    append_csv(watcher.csv_path, [["2025-10-01T00:05:00Z", "DANGER", "0.90"]])
+    texts = watcher()
+    assert len(texts) == 1 and texts[0].startswith("DANGER:")
+    assert json.loads(watcher.state_path.read_text())["last_status"] == "DANGER"
+
+
+def test_replaced_csv_is_read_from_the_top(watcher):
+    write_csv(
+        watcher.csv_path,
+        [[f"2025-10-01T00:0{n}:00Z", "SAFE", "0.40"] for n in range(5)],
+    )
+    watcher()
+    old_inode = os.stat(watcher.csv_path).st_ino
+
+    # Writer swapped in a new file (new inode), shorter than the old offset
+    new = watcher.csv_path.with_name("new.csv")
+    write_csv(new, [["2025-10-02T00:00:00Z", "WARNING", "0.60"]])
+    os.replace(new, watcher.csv_path)
+    assert os.stat(watcher.csv_path).st_ino != old_inode
+
+    texts = watcher()
+    assert len(texts) == 1 and texts[0].startswith("WARNING:")
+    state = json.loads(watcher.state_path.read_text())
+    assert state["inode"] == os.stat(watcher.csv_path).st_ino
+
+
+def test_stale_restored_batch_is_superseded_before_sending(watcher):
+    write_csv(watcher.csv_path, [["2025-10-01T00:00:00Z", "SAFE", "0.40"]])
+    watcher()
+    # Crashed with a SAFE batch unsent; meanwhile the river rose
+    state = json.loads(watcher.state_path.read_text())
+    state["pending"] = [
+        {"status": "SAFE", "text": "UPDATE: stale", "recipients": sms.RECIPIENTS}
+    ]
+    watcher.state_path.write_text(json.dumps(state))
+    append_csv(watcher.csv_path, [["2025-10-01T00:05:00Z", "DANGER", "0.90"]])
+
+    texts = watcher()
+    assert len(texts) == 1 and texts[0].startswith("DANGER:")
+
+
+def test_unsent_alerts_are_not_recorded_as_sent(watcher, monkeypatch):
+    def fail(self, text, recipients=None):
+        raise sms.SMSSendError("network down", list(recipients))
+
+    monkeypatch.setattr(FakeSMS, "send_text", fail)
+    monkeypatch.setattr(sms, "SHUTDOWN_DRAIN_SEC", 0.2)
+    write_csv(watcher.csv_path, [["2025-10-01T00:00:00Z", "DANGER", "0.90"]])
+    watcher()
+
+    state = json.loads(watcher.state_path.read_text())
+    assert state["last_sent_status"] is None
+    assert [job["status"] for job in state["pending"]] == ["DANGER"]
+
+
+def test_dry_run_is_not_recorded_as_sent(watcher, monkeypatch):
+    def suppressed(self, text, recipients=None):
+        return False
+
+    monkeypatch.setattr(FakeSMS, "send_text", suppressed)
+    write_csv(watcher.csv_path, [["2025-10-01T00:00:00Z", "SAFE", "0.40"]])
+    watcher()
+
+    state = json.loads(watcher.state_path.read_text())
+    assert state["last_sent_status"] is None
+    assert state["last_sent_at"] is None
+    assert state["pending"] == []
@@ -5,18 +5,26 @@ from datetime import datetime
 from collections import deque
 from flask import Flask, request, make_response
 
+import log_rotation
+import status_snapshot
+from settings import load_settings, alias_settings
+
 app = Flask(__name__)
 
 # -------------------------------------------------
-# Config (override via environment variables)
+# Config (override via environment variables; see settings.py)
+# USSD_LOG_PATH, STATUS_CSV_PATH, BRIDGE_STATUS, LAST_ALERT
 # -------------------------------------------------
-LOG_PATH = os.getenv("USSD_LOG_PATH", "ussd_logs.csv")
-# CSV with running status updates (timestamp,report,water_level_m)
-STATUS_CSV_PATH = os.getenv("STATUS_CSV_PATH", "/status_current.csv")
+alias_settings(
+    __name__,
+    {
+        "LOG_PATH": "ussd_log_path",
+        "STATUS_CSV_PATH": "status_csv_path",
+        "BRIDGE_STATUS": "bridge_status",
+        "LAST_ALERT": "last_alert",
+    },
+)
 
-# Legacy fallbacks (kept in case CSV is missing/empty)
-BRIDGE_STATUS = os.getenv("BRIDGE_STATUS", "SAFE")  # SAFE | WARNING | DANGER
-LAST_ALERT = os.getenv("LAST_ALERT", "No alert issued yet.")
 
 # Ensure log file exists with header
 LOG_HEADERS = [
@@ -32,19 +40,34 @@ LOG_HEADERS = [
 ]
 
 
+_log_ready = False
+
+
 def init_log():
+    global _log_ready
+    log_path = load_settings().ussd_log_path
     try:
-        if not os.path.exists(LOG_PATH):
-            with open(LOG_PATH, "w", newline="", encoding="utf-8") as f:
+        if not os.path.exists(log_path):
+            with open(log_path, "w", newline="", encoding="utf-8") as f:
                 writer = csv.writer(f)
                 writer.writerow(LOG_HEADERS)
+        _log_ready = True
     except Exception as e:
         print(f"[LOG INIT] Failed to prepare log file: {e}")
 
 
+def startup():
+    """Explicit startup hook (main.py / __main__); WSGI workers init lazily."""
+    load_settings()
+    init_log()
+
+
 def log_event(
     session_id, phone_number, service_code, text, menu_action, detail, result
 ):
+    if not _log_ready:
+        init_log()
+    log_path = load_settings().ussd_log_path
     try:
         ts_ms = int(time.time() * 1000)
         ts_iso = datetime.utcfromtimestamp(ts_ms / 1000.0).isoformat() + "Z"
@@ -59,15 +82,11 @@ def log_event(
             detail,
             result,
         ]
-        with open(LOG_PATH, "a", newline="", encoding="utf-8") as f:
-            csv.writer(f).writerow(row)
+        log_rotation.append_row(log_path, LOG_HEADERS, row)
     except Exception as e:
         print(f"[LOG WRITE] Failed to write row: {e}")
 
 
-init_log()
-
-
 # -------------------------------------------------
 # Helpers for dynamic content (CSV-driven)
 # -------------------------------------------------
@@ -75,7 +94,22 @@ def _tail_status_rows(path: str, n: int = 2):
     """
     Return up to the last n rows from the status CSV as a list of dicts
     with keys: timestamp, report, water_level_m. Latest row is last.
+    Served from the published status snapshot when it is current (0 < n <= 2).
     """
+    if 0 < n <= 2:
+        snap = status_snapshot.read_snapshot_for(path)
+        if snap and snap[0]:
+            latest, previous = snap
+            picked = [r for r in (previous, latest) if r][-n:]
+            return [
+                {
+                    "timestamp": r["timestamp"],
+                    "report": r["report"].upper(),
+                    "water_level_m": r["water_level_m"],
+                }
+                for r in picked
+            ]
+
     rows = deque(maxlen=n)
     try:
         with open(path, "r", newline="", encoding="utf-8") as f:
@@ -125,11 +159,12 @@ def _format_status_message(report: str, level: str, when: str, current: bool) ->
 
 def get_current_and_previous_status():
     """
-    Read last and previous rows from STATUS_CSV_PATH.
+    Read last and previous rows from the status CSV (STATUS_CSV_PATH).
     Returns (current_msg, previous_msg).
     Falls back to env-based messages if CSV missing/empty.
     """
-    rows = _tail_status_rows(STATUS_CSV_PATH, n=2)
+    config = load_settings()
+    rows = _tail_status_rows(config.status_csv_path, n=2)
 
     # Determine current (last row) and previous (second-last row if present)
     current = rows[-1] if rows else None
@@ -147,7 +182,7 @@ def get_current_and_previous_status():
     else:
         # Fallback to env BRIDGE_STATUS
         cur_msg = _format_status_message(
-            BRIDGE_STATUS.upper().strip(), "", "", current=True
+            config.bridge_status.upper().strip(), "", "", current=True
         )
 
     if previous:
@@ -159,7 +194,7 @@ def get_current_and_previous_status():
         )
     else:
         # Fallback to env LAST_ALERT text (kept for compatibility)
-        prev_msg = f"Previous status: {os.getenv('LAST_ALERT', LAST_ALERT)}"
+        prev_msg = f"Previous status: {config.last_alert}"
 
     return cur_msg, prev_msg
 
@@ -357,4 +392,5 @@ def ussd():
 # -------------------------------------------------
 if __name__ == "__main__":
     # For local testing; in production, run via gunicorn/uwsgi
-    app.run(host="0.0.0.0", port=int(os.getenv("PORT", 5000)), debug=True)
+    startup()
+    app.run(host="0.0.0.0", port=load_settings().port, debug=True)
@@ -0,0 +1,69 @@
+"""
+Crash-safe checkpoint of the SMS watcher's state.
+
+The watcher saves what it needs to resume (last row signature, last decided
+status, where the latest row starts in the status CSV, the CSV's
+inode/size/mtime, alert batches still waiting in the scheduler, and what was
+last actually sent and when) after every handled change and every send. On
+restart it picks up from there instead of re-reading the whole CSV and
+re-broadcasting the current status: it replays unsent batches and otherwise
+only alerts if the status changed while it was down.
+
+The file is small JSON written with temp file + rename, so a crash mid-write
+leaves the previous checkpoint intact.
+"""
+import os
+import json
+from typing import Optional, Dict, Any, Tuple
+
+from status_snapshot import atomic_write
+
+STATE_VERSION = 1
+
+EMPTY_STATE: Dict[str, Any] = {
+    "version": STATE_VERSION,
+    "signature": None,
+    "last_status": None,
+    "offset": 0,
+    "inode": None,
+    "size": None,
+    "mtime_ns": None,
+    "pending": [],
+    "last_sent_status": None,
+    "last_sent_at": None,
+}
+
+
+def load_state(path: str) -> Optional[Dict[str, Any]]:
+    """Return the saved state, or None if there is no usable checkpoint."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[STATE] Ignoring unreadable checkpoint {path}: {e}")
+        return None
+    if not isinstance(data, dict) or data.get("version") != STATE_VERSION:
+        print(f"[STATE] Ignoring checkpoint with unknown format: {path}")
+        return None
+    state = dict(EMPTY_STATE)
+    state.update(data)
+    return state
+
+
+def save_state(path: str, state: Dict[str, Any]):
+    data = dict(state, version=STATE_VERSION)
+    try:
+        atomic_write(path, json.dumps(data, sort_keys=True).encode("utf-8"))
+    except Exception as e:
+        print(f"[STATE] Failed to save checkpoint {path}: {e}")
+
+
+def file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    """(inode, size, mtime_ns) of path, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns